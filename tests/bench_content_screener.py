@@ -0,0 +1,138 @@
+"""
+Benchmark the Toots content screener against the original implementation.
+
+    python tests/bench_content_screener.py [page.html ...]
+
+Without arguments a synthetic page of about 900 KB is screened. The
+original screener (a series of re.search/re.sub calls) is kept here as the
+reference every optimization has to beat.
+"""
+
+import importlib.util
+import re
+import sys
+import time
+from pathlib import Path
+
+_PATH = Path(__file__).resolve().parent.parent / "toolkit" / "content_screener.py"
+_spec = importlib.util.spec_from_file_location("content_screener", _PATH)
+content_screener = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(content_screener)
+
+
+def baseline_screen(html: str):
+    """The screener as originally written, minus the report."""
+    threats = []
+    warnings = []
+    risk_score = 0
+
+    injection_patterns = [
+        (r'<!--\s*ignore\s+previous', "Hidden instruction in comment"),
+        (r'<!--\s*system\s*:', "System prompt injection attempt"),
+        (r'<!--\s*assistant\s*:', "Role override attempt"),
+        (r'\[system\s*:', "System instruction injection"),
+        (r'\[ignore', "Ignore directive"),
+    ]
+    for pattern, description in injection_patterns:
+        if re.search(pattern, html, re.IGNORECASE):
+            threats.append(f"PROMPT INJECTION: {description}")
+            risk_score += 40
+
+    if re.search(r'<script[^>]*>[^<]*eval\s*\(', html, re.IGNORECASE):
+        threats.append("DYNAMIC CODE: eval() in script")
+        risk_score += 30
+    if re.search(r'<script[^>]*>[^<]*document\.write', html, re.IGNORECASE):
+        threats.append("DOM MANIPULATION: document.write detected")
+        risk_score += 20
+
+    hidden_selectors = [
+        r'display\s*:\s*none',
+        r'visibility\s*:\s*hidden',
+        r'opacity\s*:\s*0',
+        r'position\s*:\s*absolute[^}]*left\s*:\s*-9999',
+    ]
+    hidden_count = 0
+    for pattern in hidden_selectors:
+        hidden_count += len(re.findall(pattern, html, re.IGNORECASE))
+    if hidden_count > 5:
+        warnings.append(f"{hidden_count} hidden elements detected")
+        risk_score += min(hidden_count, 15)
+
+    if re.search(r'&#x[0-9a-f]+;|&#\d+;|base64,', html, re.IGNORECASE):
+        warnings.append("Encoded content present (may be obfuscated)")
+        risk_score += 10
+
+    if re.search(r'<meta[^>]*http-equiv\s*=\s*["\']refresh["\'][^>]*>', html, re.IGNORECASE):
+        threats.append("REDIRECT: Meta refresh tag")
+        risk_score += 25
+
+    html = re.sub(r'<script[^>]*>.*?</script>', '[SCRIPT REMOVED]', html, flags=re.DOTALL | re.IGNORECASE)
+    html = re.sub(r'\s(on\w+)\s*=\s*["\'][^"\']*["\']', '', html, flags=re.IGNORECASE)
+    html = re.sub(r'href\s*=\s*["\']javascript:[^"\']*["\']', 'href="#"', html, flags=re.IGNORECASE)
+    html = re.sub(r'<meta[^>]*http-equiv\s*=\s*["\']refresh["\'][^>]*>', '[REDIRECT REMOVED]', html, flags=re.IGNORECASE)
+    html = re.sub(r'<!--\s*(ignore|system|assistant|instructions?)\b.*?-->', '[SUSPICIOUS COMMENT REMOVED]', html, flags=re.IGNORECASE | re.DOTALL)
+
+    return html, threats, warnings, risk_score
+
+
+def synthetic_page(size: int = 900 * 1024) -> str:
+    """A documentation-style page: markup, inline scripts, styles and entities."""
+    head = (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<title>Guide &mdash; Chapter</title>'
+        '<style>.sidebar-hidden{display:none}.sr-only{position:absolute;left:-9999px}</style>'
+        '<script src="/static/app.js"></script>'
+        '<script>window.dataLayer = window.dataLayer || []; dataLayer.push({page: "guide"});</script>'
+        '</head><body class="light sidebar-visible">'
+    )
+    section = (
+        '<section id="s{n}"><h2><a class="header" href="#s{n}">Section {n}</a></h2>'
+        '<p>Ownership is a set of rules that govern how a program manages memory. '
+        'Some languages have garbage collection that regularly looks for no-longer-used memory '
+        'as the program runs; in other languages, the programmer must explicitly allocate '
+        'and free the memory. Rust uses a third approach&nbsp;&#8212; memory is managed '
+        'through a system of ownership with a set of rules that the compiler checks.</p>'
+        '<pre><code class="language-rust">fn main() {{\n    let s = String::from("hello");\n'
+        '    takes_ownership(s);\n    let x = 5;\n    makes_copy(x);\n}}\n</code></pre>'
+        '<ul><li><a href="ch04-01.html">What Is Ownership?</a></li>'
+        '<li><a href="ch04-02.html" title="References &amp; Borrowing">References</a></li></ul>'
+        '<button class="copy" aria-label="Copy to clipboard" onclick="copy(this)">Copy</button>'
+        '</section>\n'
+    )
+    tail = '<script>hljs.highlightAll();</script></body></html>'
+
+    parts = [head]
+    length = len(head) + len(tail)
+    n = 0
+    while length < size:
+        chunk = section.format(n=n)
+        parts.append(chunk)
+        length += len(chunk)
+        n += 1
+    parts.append(tail)
+    return "".join(parts)
+
+
+def best_of(func, html: str, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(html)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(paths):
+    pages = [(str(path), Path(path).read_text(encoding="utf-8", errors="replace")) for path in paths]
+    if not pages:
+        pages = [("synthetic", synthetic_page())]
+
+    screener = content_screener.ContentScreener(cache_size=0)
+    for name, html in pages:
+        baseline = best_of(baseline_screen, html)
+        current = best_of(screener._analyze, html)
+        print(f"{name} ({len(html) // 1024} KB): baseline {baseline:.3f}s, current {current:.3f}s ({baseline / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
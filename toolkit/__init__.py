@@ -23,7 +23,10 @@ class BrowserPlugin:
         """Initialize the browser service."""
         self.browser = BrowserService(
             headless=self.config.get("headless", True),
-            screenshot_dir=self.config.get("screenshot_dir", "/tmp/busy38/screenshots")
+            screenshot_dir=self.config.get("screenshot_dir", "/tmp/busy38/screenshots"),
+            max_navigations=self.config.get("max_navigations", 100),
+            wait_until=self.config.get("wait_until", "domcontentloaded"),
+            nav_timeout_ms=self.config.get("nav_timeout_ms", 15000)
         )
         await self.browser.initialize()
     
@@ -37,9 +40,9 @@ class BrowserPlugin:
         """[browser:navigate <url>] - Navigate to URL."""
         return await self.browser.navigate(url)
     
-    async def screenshot(self, selector: str = None) -> dict:
+    async def screenshot(self, selector: str = None, include_base64: bool = False) -> dict:
         """[browser:screenshot <selector?>] - Capture screenshot."""
-        return await self.browser.screenshot(selector)
+        return await self.browser.screenshot(selector, include_base64=include_base64)
     
     async def click(self, selector: str) -> dict:
         """[browser:click <selector>] - Click element."""
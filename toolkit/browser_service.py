@@ -4,21 +4,44 @@ Browser Service - Web automation using Playwright.
 Ported from OpenClaw browser functionality.
 """
 
+import asyncio
 import os
 import base64
 from typing import Optional, Dict, Any
-from playwright.async_api import async_playwright, Page, Browser
+from playwright.async_api import async_playwright, Page, Browser, BrowserContext
+
+# Characters that are unsafe in filenames on common filesystems
+_FS_SAFE = str.maketrans({c: "_" for c in '/\\:?"*<>|'})
 
 
 class BrowserService:
     """Web browser automation service."""
     
-    def __init__(self, headless: bool = True, screenshot_dir: str = "/tmp/busy38/screenshots"):
+    # Keep Chromium lean in containers without giving up its sandbox
+    _LAUNCH_ARGS = ["--disable-dev-shm-usage", "--disable-gpu"]
+    
+    # Shared by every call made before initialize(); callers must not mutate it
+    _NOT_INIT_ERR = {"success": False, "error": "Browser not initialized"}
+    
+    def __init__(
+        self,
+        headless: bool = True,
+        screenshot_dir: str = "/tmp/busy38/screenshots",
+        max_navigations: int = 100,
+        wait_until: str = "domcontentloaded",
+        nav_timeout_ms: int = 15000,
+    ):
         self.headless = headless
         self.screenshot_dir = screenshot_dir
+        self.max_navigations = max_navigations
+        self.wait_until = wait_until
+        self.nav_timeout_ms = nav_timeout_ms
         self.playwright = None
         self.browser: Optional[Browser] = None
+        self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self._navigations = 0
+        self._crashed = False
         
         # Ensure screenshot directory exists
         os.makedirs(screenshot_dir, exist_ok=True)
@@ -26,16 +49,48 @@ class BrowserService:
     async def initialize(self):
         """Initialize Playwright browser."""
         self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=self.headless)
-        self.page = await self.browser.new_page()
-        
-        # Set viewport
-        await self.page.set_viewport_size({"width": 1280, "height": 720})
+        self.browser = await self.playwright.chromium.launch(headless=self.headless, args=self._LAUNCH_ARGS)
+        await self._open_page()
+    
+    async def _open_page(self, storage_state: Optional[Dict[str, Any]] = None):
+        """Open a fresh context and page, optionally carrying over cookies and storage."""
+        self.context = await self.browser.new_context(
+            viewport={"width": 1280, "height": 720},
+            storage_state=storage_state
+        )
+        self.page = await self.context.new_page()
+        self.page.on("crash", self._on_crash)
+        self._navigations = 0
+        self._crashed = False
+    
+    def _on_crash(self, page: Page):
+        """Mark the page for recycling; a crashed page is not reported as closed."""
+        self._crashed = True
+    
+    async def _recycle_page(self):
+        """Replace a crashed or long-lived context so leaked memory is released."""
+        storage_state = None
+        try:
+            storage_state = await self.context.storage_state()
+        except Exception:
+            pass
+        try:
+            await self.context.close()
+        except Exception:
+            pass
+        await self._open_page(storage_state)
+    
+    @staticmethod
+    def _err(exc: Exception) -> Dict[str, Any]:
+        """Build the failure result for an action that raised."""
+        return {"success": False, "error": str(exc)}
     
     async def close(self):
         """Close browser and cleanup."""
         if self.page:
             await self.page.close()
+        if self.context:
+            await self.context.close()
         if self.browser:
             await self.browser.close()
         if self.playwright:
@@ -44,10 +99,15 @@ class BrowserService:
     async def navigate(self, url: str) -> Dict[str, Any]:
         """Navigate to URL."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
-            response = await self.page.goto(url, wait_until="networkidle")
+            # Navigation discards page state anyway, so it is the safe point to recycle
+            if self._crashed or self.page.is_closed() or self._navigations >= self.max_navigations:
+                await self._recycle_page()
+            self._navigations += 1
+            
+            response = await self.page.goto(url, wait_until=self.wait_until, timeout=self.nav_timeout_ms)
             
             return {
                 "success": True,
@@ -56,46 +116,45 @@ class BrowserService:
                 "status": response.status if response else None
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
-    async def screenshot(self, selector: Optional[str] = None) -> Dict[str, Any]:
-        """Capture screenshot."""
+    async def screenshot(self, selector: Optional[str] = None, include_base64: bool = False) -> Dict[str, Any]:
+        """Capture screenshot. The PNG is only base64-encoded into the result if requested."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
+            page_url = self.page.url
+            filename = f"screenshot_{page_url[:50].translate(_FS_SAFE)}.png"
+            filepath = os.path.join(self.screenshot_dir, filename)
+            
+            # Playwright writes the file itself, keeping disk I/O off the event loop
             if selector:
                 # Screenshot specific element
                 element = await self.page.query_selector(selector)
                 if not element:
                     return {"success": False, "error": f"Element not found: {selector}"}
-                screenshot_bytes = await element.screenshot()
+                screenshot_bytes = await element.screenshot(path=filepath)
             else:
                 # Full page screenshot
-                screenshot_bytes = await self.page.screenshot(full_page=True)
+                screenshot_bytes = await self.page.screenshot(path=filepath, full_page=True)
             
-            # Encode as base64
-            screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
-            
-            # Save to file
-            filename = f"screenshot_{self.page.url.replace('/', '_')[:50]}.png"
-            filepath = os.path.join(self.screenshot_dir, filename)
-            with open(filepath, "wb") as f:
-                f.write(screenshot_bytes)
-            
-            return {
+            result = {
                 "success": True,
-                "screenshot_base64": screenshot_b64,
                 "filepath": filepath,
-                "url": self.page.url
+                "url": page_url
             }
+            if include_base64:
+                result["screenshot_base64"] = base64.b64encode(screenshot_bytes).decode("ascii")
+            
+            return result
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
     async def click(self, selector: str) -> Dict[str, Any]:
         """Click element."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
             await self.page.click(selector)
@@ -106,12 +165,12 @@ class BrowserService:
                 "url": self.page.url
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
     async def type_text(self, selector: str, text: str) -> Dict[str, Any]:
         """Type text into input."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
             await self.page.fill(selector, text)
@@ -122,12 +181,12 @@ class BrowserService:
                 "text_length": len(text)
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
     async def evaluate(self, javascript: str) -> Dict[str, Any]:
         """Execute JavaScript."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
             result = await self.page.evaluate(javascript)
@@ -137,12 +196,12 @@ class BrowserService:
                 "javascript": javascript[:100] + "..." if len(javascript) > 100 else javascript
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
     async def extract_text(self, selector: str = "body") -> Dict[str, Any]:
         """Extract text content from selector."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
             element = await self.page.query_selector(selector)
@@ -158,17 +217,28 @@ class BrowserService:
                 "length": len(text)
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
+            return self._err(e)
     
     async def get_page_content(self) -> Dict[str, Any]:
         """Get full page content."""
         if not self.page:
-            return {"success": False, "error": "Browser not initialized"}
+            return self._NOT_INIT_ERR
         
         try:
-            html = await self.page.content()
-            text = await self.page.inner_text("body")
-            title = await self.page.title()
+            # Playwright's accessors run in an isolated world, so page scripts
+            # cannot redefine the getters they read; issue them concurrently.
+            # Wait for all three before raising so a failure in one does not
+            # leave the others running with nobody to collect their errors.
+            results = await asyncio.gather(
+                self.page.content(),
+                self.page.inner_text("body"),
+                self.page.title(),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            html, text, title = results
             
             return {
                 "success": True,
@@ -178,4 +248,4 @@ class BrowserService:
                 "text": text
             }
         except Exception as e:
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            return self._err(e)
\ No newline at end of file
@@ -4,8 +4,274 @@ Content Screener - Toots security integration for browser content.
 Screens web content for context injection and malicious payloads.
 """
 
+import asyncio
+import hashlib
 import re
-from typing import Dict, List, Any
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Tuple
+
+
+# re.IGNORECASE keeps re from skipping ahead to a literal prefix that is a
+# letter, so every case-insensitive search crawled the page one character at
+# a time. Instead the page is folded to lowercase once and searched with
+# lowercase, case-sensitive patterns. These characters match ASCII letters
+# under IGNORECASE but str.lower() leaves them alone (or, for U+0130, makes
+# two characters of it), so they are mapped first. After that, folding never
+# changes the length of the page and positions carry over.
+_FOLDS = (("\u0130", "i"), ("\u0131", "i"), ("\u017f", "s"))
+
+# Prompt injection patterns, checked one at a time so each keeps its literal prefix
+_INJECTION_PATTERNS = [
+    ("ignore", re.compile(r'<!--\s*ignore\s+previous'), "Hidden instruction in comment"),
+    ("system_comment", re.compile(r'<!--\s*system\s*:'), "System prompt injection attempt"),
+    ("assistant_comment", re.compile(r'<!--\s*assistant\s*:'), "Role override attempt"),
+    ("system_bracket", re.compile(r'\[system\s*:'), "System instruction injection"),
+    ("ignore_bracket", re.compile(r'\[ignore'), "Ignore directive"),
+]
+
+# Hidden content selectors, each counted on its own
+_HIDDEN_RES = (
+    re.compile(r'display\s*:\s*none'),
+    re.compile(r'visibility\s*:\s*hidden'),
+    re.compile(r'opacity\s*:\s*0'),
+)
+_POSITION_ABSOLUTE_RE = re.compile(r'position\s*:\s*absolute')
+_POSITION_LEFT_RE = re.compile(r'left\s*:\s*-9999')
+
+_ENTITY_RE = re.compile(r'&#(?:x[0-9a-f]+|\d+);')
+_SCRIPT_EVAL_RE = re.compile(r'eval\s*\(')
+_META_REFRESH_ATTR_RE = re.compile(r'http-equiv\s*=\s*(?:"refresh"|\'refresh\'|refresh[\s/>])')
+
+# Pages at least this many characters long are screened in a worker thread
+_THREAD_THRESHOLD = 128 * 1024
+
+# Sanitizer passes, run one after another in this order on the output of the
+# previous pass, as separate substitutions would. Removing a span can close
+# up text into a new comment or javascript: URL, and the later passes still
+# see it. Attribute values may be double-quoted, single-quoted or bare; each
+# quoted form runs to its own closing quote so nested quotes are covered.
+# Event handlers must follow whitespace, which is removed with them. Checking
+# it in a lookbehind keeps re from running on\w+ over every "on" inside a
+# word; putting the lookbehind after the literal "on" keeps re's fast prefix
+# search. _attribute_spans finds where a bare value ends itself, so that a
+# run of openers inside one long value is not rescanned once per opener.
+_EVENT_RE = re.compile(r'on(?<=\son)\w+\s*=\s*(?:"[^"]*"|\'[^\']*\'|(?P<bare>(?=[^\s"\'>])))')
+_JS_URL_RE = re.compile(r'href\s*=\s*(?:"\s*javascript:[^"]*"|\'\s*javascript:[^\']*\'|(?P<bare>javascript:))')
+_BARE_VALUE_END_RE = re.compile(r'[\s"\'>]')
+# An open tag runs to the first '>' outside a quoted attribute value
+_TAG_OPEN_RE = re.compile(r'<[A-Za-z]')
+_TAG_BODY_RE = re.compile(r'[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*')
+_COMMENT_OPEN_RE = re.compile(r'<!--\s*(?:ignore|system|assistant|instructions?)\b')
+
+
+def _fold(html: str) -> str:
+    """Lowercase html so that lowercase patterns match it as IGNORECASE would."""
+    for char, letter in _FOLDS:
+        if char in html:
+            html = html.replace(char, letter)
+    return html.lower()
+
+
+def _script_threats(text: str) -> Tuple[bool, bool]:
+    """Whether a script body calls eval() or document.write, up to its first '<'."""
+    has_eval = has_write = False
+    tag_end = -1
+    pos = 0
+    while True:
+        start = text.find("<script", pos)
+        if start < 0:
+            break
+        pos = start + 1
+        if tag_end >= start:
+            # Same opening tag as the previous <script, body already checked
+            continue
+        tag_end = text.find(">", start)
+        if tag_end < 0:
+            break
+        body = tag_end + 1
+        body_end = text.find("<", body)
+        if body_end < 0:
+            body_end = len(text)
+        has_eval = has_eval or _SCRIPT_EVAL_RE.search(text, body, body_end) is not None
+        has_write = has_write or text.find("document.write", body, body_end) >= 0
+    return has_eval, has_write
+
+
+def _count_offscreen(text: str) -> int:
+    """Count position:absolute ... left:-9999 runs like re.findall, in linear time."""
+    count = 0
+    matched_end = 0
+    size = len(text)
+    # The next '}' and the last left:-9999 before it, searched for again only
+    # once the scan has moved past them
+    brace = -1
+    segment = -1
+    left_start = left_end = -1
+    for match in _POSITION_ABSOLUTE_RE.finditer(text):
+        # findall never overlaps its own previous match
+        if match.start() < matched_end:
+            continue
+        end = match.end()
+        if brace < end:
+            brace = text.find("}", end)
+            if brace < 0:
+                brace = size
+        if segment != brace:
+            # [^}]* runs greedily to the last left:-9999 before the next '}'
+            segment = brace
+            left_start = -1
+            for left in _POSITION_LEFT_RE.finditer(text, end, brace):
+                left_start, left_end = left.start(), left.end()
+        if left_start < end:
+            continue
+        count += 1
+        matched_end = left_end
+    return count
+
+
+def _splice(html: str, spans) -> str:
+    """Replace (start, end, replacement) spans, given in order and not overlapping."""
+    pieces = []
+    emitted = 0
+    for start, end, replacement in spans:
+        pieces.append(html[emitted:start])
+        pieces.append(replacement)
+        emitted = end
+    
+    # Untouched text comes back as-is
+    if not pieces:
+        return html
+    pieces.append(html[emitted:])
+    return "".join(pieces)
+
+
+def _script_spans(text: str):
+    """<script ...>...</script> blocks, matched like the non-greedy regex but in linear time."""
+    tag_end = -1
+    close = -1
+    pos = 0
+    while True:
+        start = text.find("<script", pos)
+        if start < 0:
+            return
+        if tag_end < start:
+            tag_end = text.find(">", start)
+            if tag_end < 0:
+                return
+        if close <= tag_end:
+            close = text.find("</script>", tag_end + 1)
+            if close < 0:
+                return
+        pos = close + len("</script>")
+        yield start, pos, "[SCRIPT REMOVED]"
+
+
+def _attribute_spans(html: str, text: str, pattern, replacement: str, after_space: bool = False):
+    """
+    Event handler or javascript: URL attributes matched by pattern.
+    
+    With after_space, the whitespace the pattern's lookbehind saw is
+    removed along with it. Bare values look like ordinary prose and code
+    ("let online = true"), so they only count inside an open tag.
+    """
+    offset = 1 if after_space else 0
+    size = len(text)
+    # The open tag html[tag_start:tag_end] reached so far, and the end of the
+    # bare value found last
+    tag_start = tag_end = 0
+    value_end = -1
+    pos = 0
+    while True:
+        # The whitespace before a match must not lie before pos either
+        match = pattern.search(text, pos + offset)
+        if match is None:
+            return
+        start = match.start() - offset
+        end = match.end()
+        if match.group("bare") is not None:
+            # Tag names are ASCII, so tags are found in the page itself rather than its folding
+            while tag_end <= start:
+                opener = _TAG_OPEN_RE.search(html, tag_end)
+                if opener is None:
+                    tag_start = tag_end = size + 1
+                    break
+                tag_start = opener.start()
+                tag_end = _TAG_BODY_RE.match(html, opener.end()).end()
+            if not tag_start < start < tag_end:
+                pos = start + 1
+                continue
+            if value_end < end:
+                delimiter = _BARE_VALUE_END_RE.search(text, end)
+                value_end = delimiter.start() if delimiter else size
+            end = value_end
+        pos = end
+        yield start, pos, replacement
+
+
+def _meta_refresh_spans(text: str):
+    """<meta> tags with http-equiv=refresh, each found with one search per tag."""
+    tag_end = -1
+    attr = -1
+    pos = 0
+    while True:
+        start = text.find("<meta", pos)
+        if start < 0:
+            return
+        opener_end = start + len("<meta")
+        pos = start + 1
+        if tag_end < start:
+            tag_end = text.find(">", start)
+            if tag_end < 0:
+                return
+            attr = -1
+        # The tag is a refresh if http-equiv=refresh appears before its '>'
+        if attr < opener_end:
+            found = _META_REFRESH_ATTR_RE.search(text, opener_end, tag_end + 1)
+            attr = found.start() if found else tag_end + 1
+        if attr > tag_end:
+            continue
+        pos = tag_end + 1
+        yield start, pos, "[REDIRECT REMOVED]"
+
+
+def _comment_spans(text: str):
+    """Suspicious comments up to the first '-->', found once for all openers before it."""
+    close = -1
+    pos = 0
+    while True:
+        match = _COMMENT_OPEN_RE.search(text, pos)
+        if match is None:
+            return
+        if close < match.end():
+            close = text.find("-->", match.end())
+            if close < 0:
+                return
+        pos = close + len("-->")
+        yield match.start(), pos, "[SUSPICIOUS COMMENT REMOVED]"
+
+
+def _run_pass(html: str, text: str, spans) -> Tuple[str, str]:
+    """Apply spans found in the folded text to both the page and its folded copy."""
+    spans = list(spans)
+    if not spans:
+        return html, text
+    folded = [(start, end, replacement.lower()) for start, end, replacement in spans]
+    return _splice(html, spans), _splice(text, folded)
+
+
+def _strip_active_content(html: str, text: str) -> Tuple[str, str]:
+    """Run every sanitizer pass but the comment one; script blocks go first."""
+    html, text = _run_pass(html, text, _script_spans(text))
+    html, text = _run_pass(html, text, _attribute_spans(html, text, _EVENT_RE, "", after_space=True))
+    html, text = _run_pass(html, text, _attribute_spans(html, text, _JS_URL_RE, 'href="#"'))
+    return _run_pass(html, text, _meta_refresh_spans(text))
+
+
+def _sanitize(html: str) -> str:
+    """Run all sanitizer passes."""
+    html, text = _strip_active_content(html, _fold(html))
+    return _splice(html, _comment_spans(text))
 
 
 class ContentScreener:
@@ -18,13 +284,25 @@ class ContentScreener:
     - Sanitizes before agent consumption
     """
     
-    def __init__(self, risk_threshold: int = 50):
+    def __init__(self, risk_threshold: int = 50, cache_size: int = 128, cache_chars: int = 8 * 1024 * 1024):
         self.risk_threshold = risk_threshold
+        
+        # Recently screened pages, keyed by content digest (LRU order). Entries
+        # hold the sanitized page, so the cache is capped by total characters
+        # as well as by entry count.
+        self._cache: "OrderedDict[bytes, Tuple[str, List[str], List[str], int]]" = OrderedDict()
+        self._cache_max = cache_size
+        self._cache_chars_max = cache_chars
+        self._cache_chars = 0
+        self._cache_lock = threading.Lock()
     
-    async def screen_content(self, html: str, url: str = "") -> Dict[str, Any]:
+    async def screen_content(self, html: str, url: str = "", include_report: bool = True) -> Dict[str, Any]:
         """
         Screen HTML content for security threats.
         
+        Callers that only look at the verdict can pass include_report=False
+        to skip formatting the Toots report (toots_report is then None).
+        
         Returns:
             {
                 "safe": bool,
@@ -32,96 +310,121 @@ class ContentScreener:
                 "threats": [],
                 "warnings": [],
                 "risk_score": int,
-                "toots_report": str  # Noir detective commentary
+                "toots_report": Optional[str]  # Noir detective commentary
             }
         """
+        # Large pages take long enough to stall other coroutines; screen them off the loop
+        if len(html) >= _THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._screen_sync, html, url, include_report)
+        return self._screen_sync(html, url, include_report)
+    
+    def _screen_sync(self, html: str, url: str = "", include_report: bool = True) -> Dict[str, Any]:
+        """Synchronous core of screen_content."""
+        sanitized, threats, warnings, risk_score = self._analyze_cached(html)
+        
+        # Generate Toots-style noir report
+        toots_report = None
+        if include_report:
+            toots_report = self._generate_toots_report(threats, warnings, risk_score, url)
+        
+        return {
+            "safe": risk_score < self.risk_threshold,
+            "sanitized_content": sanitized,
+            "threats": threats,
+            "warnings": warnings,
+            "risk_score": risk_score,
+            "toots_report": toots_report
+        }
+    
+    def _analyze_cached(self, html: str) -> Tuple[str, List[str], List[str], int]:
+        """Run _analyze, reusing the result for pages screened recently."""
+        if self._cache_max <= 0:
+            return self._analyze(html)
+        
+        key = hashlib.blake2b(html.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        
+        if cached is None:
+            cached = self._analyze(html)
+            size = len(cached[0])
+            # A page bigger than the whole budget would only flush everything else
+            if size <= self._cache_chars_max:
+                with self._cache_lock:
+                    if key not in self._cache:
+                        self._cache[key] = cached
+                        self._cache_chars += size
+                    while len(self._cache) > self._cache_max or self._cache_chars > self._cache_chars_max:
+                        _, evicted = self._cache.popitem(last=False)
+                        self._cache_chars -= len(evicted[0])
+        
+        # Hand out fresh lists so callers cannot corrupt the cached entry
+        sanitized, threats, warnings, risk_score = cached
+        return sanitized, list(threats), list(warnings), risk_score
+    
+    def _analyze(self, html: str) -> Tuple[str, List[str], List[str], int]:
+        """
+        Screen HTML, then sanitize it.
+        
+        Sanitizing removes script blocks before anything else, so a meta tag
+        or comment that overlaps a script loses the overlapping part with it.
+        
+        Returns (sanitized_content, threats, warnings, risk_score).
+        """
+        text = _fold(html)
+        
+        injections = {name for name, pattern, _ in _INJECTION_PATTERNS if pattern.search(text)}
+        has_eval, has_write = _script_threats(text)
+        # Each selector is counted on its own, without building a list of its matches
+        hidden_count = _count_offscreen(text)
+        for pattern in _HIDDEN_RES:
+            hidden_count += sum(1 for _ in pattern.finditer(text))
+        encoded = "base64," in text or _ENTITY_RE.search(text) is not None
+        meta_refresh = next(_meta_refresh_spans(text), None) is not None
+        
+        # Clean pages come back as-is; only rebuilt when something was removed
+        stripped, stripped_text = _strip_active_content(html, text)
+        if stripped is not html:
+            # Removing a handler can join text into a new injection marker
+            injections.update(name for name, pattern, _ in _INJECTION_PATTERNS if pattern.search(stripped_text))
+        sanitized = _splice(stripped, _comment_spans(stripped_text))
+        
         threats = []
         warnings = []
         risk_score = 0
         
-        # Check for prompt injection patterns
-        injection_patterns = [
-            (r'<!--\s*ignore\s+previous', "Hidden instruction in comment"),
-            (r'<!--\s*system\s*:', "System prompt injection attempt"),
-            (r'<!--\s*assistant\s*:', "Role override attempt"),
-            (r'\[system\s*:', "System instruction injection"),
-            (r'\[ignore', "Ignore directive"),
-        ]
-        
-        for pattern, description in injection_patterns:
-            if re.search(pattern, html, re.IGNORECASE):
+        for name, _, description in _INJECTION_PATTERNS:
+            if name in injections:
                 threats.append(f"PROMPT INJECTION: {description}")
                 risk_score += 40
         
-        # Check for suspicious scripts
-        if re.search(r'<script[^>]*>[^<]*eval\s*\(', html, re.IGNORECASE):
+        if has_eval:
             threats.append("DYNAMIC CODE: eval() in script")
             risk_score += 30
         
-        if re.search(r'<script[^>]*>[^<]*document\.write', html, re.IGNORECASE):
+        if has_write:
             threats.append("DOM MANIPULATION: document.write detected")
             risk_score += 20
         
-        # Check for hidden content
-        hidden_selectors = [
-            r'display\s*:\s*none',
-            r'visibility\s*:\s*hidden',
-            r'opacity\s*:\s*0',
-            r'position\s*:\s*absolute[^}]*left\s*:\s*-9999',
-        ]
-        
-        hidden_count = 0
-        for pattern in hidden_selectors:
-            hidden_count += len(re.findall(pattern, html, re.IGNORECASE))
-        
         if hidden_count > 5:
             warnings.append(f"{hidden_count} hidden elements detected")
             risk_score += min(hidden_count, 15)
         
-        # Check for encoded content
-        if re.search(r'&#x[0-9a-f]+;|&#\d+;|base64,', html, re.IGNORECASE):
+        if encoded:
             warnings.append("Encoded content present (may be obfuscated)")
             risk_score += 10
         
-        # Check for external redirects
-        meta_refresh = re.search(r'<meta[^>]*http-equiv\s*=\s*["\']refresh["\'][^>]*>', html, re.IGNORECASE)
         if meta_refresh:
             threats.append("REDIRECT: Meta refresh tag")
             risk_score += 25
         
-        # Sanitize content
-        sanitized = self._sanitize_content(html)
-        
-        # Generate Toots-style noir report
-        toots_report = self._generate_toots_report(threats, warnings, risk_score, url)
-        
-        return {
-            "safe": risk_score < self.risk_threshold,
-            "sanitized_content": sanitized,
-            "threats": threats,
-            "warnings": warnings,
-            "risk_score": risk_score,
-            "toots_report": toots_report
-        }
+        return sanitized, threats, warnings, risk_score
     
     def _sanitize_content(self, html: str) -> str:
         """Remove dangerous content while preserving structure."""
-        # Remove script tags entirely
-        html = re.sub(r'<script[^>]*>.*?</script>', '[SCRIPT REMOVED]', html, flags=re.DOTALL | re.IGNORECASE)
-        
-        # Remove event handlers
-        html = re.sub(r'\s(on\w+)\s*=\s*["\'][^"\']*["\']', '', html, flags=re.IGNORECASE)
-        
-        # Remove javascript: URLs
-        html = re.sub(r'href\s*=\s*["\']javascript:[^"\']*["\']', 'href="#"', html, flags=re.IGNORECASE)
-        
-        # Remove meta refresh
-        html = re.sub(r'<meta[^>]*http-equiv\s*=\s*["\']refresh["\'][^>]*>', '[REDIRECT REMOVED]', html, flags=re.IGNORECASE)
-        
-        # Remove suspicious comments (keep regular ones)
-        html = re.sub(r'<!--\s*(ignore|system|assistant|instructions?)\b.*?-->', '[SUSPICIOUS COMMENT REMOVED]', html, flags=re.IGNORECASE | re.DOTALL)
-        
-        return html
+        return _sanitize(html)
     
     def _generate_toots_report(self, threats: List[str], warnings: List[str], risk_score: int, url: str) -> str:
         """Generate noir detective commentary."""